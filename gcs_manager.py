@@ -1,7 +1,11 @@
 import os
 import json
 import logging
+import functools
+import google.auth
+from google.auth.transport.requests import AuthorizedSession
 from google.cloud import storage
+from requests.adapters import HTTPAdapter
 from google.api_core.exceptions import NotFound
 from dotenv import load_dotenv
 
@@ -11,6 +15,23 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("gcs-manager")
 
+# Connection pool for the shared client; the requests default of 10 is too small
+# once admin handlers and consultation uploads run GCS calls in parallel threads.
+GCS_POOL_SIZE = int(os.getenv("GCS_POOL_SIZE", "50"))
+
+@functools.lru_cache(maxsize=None)
+def get_storage_client():
+    """
+    Returns a process-wide storage.Client backed by one pooled AuthorizedSession,
+    so every caller reuses the same keep-alive TLS connections.
+    """
+    credentials, default_project = google.auth.default(scopes=storage.Client.SCOPE)
+    session = AuthorizedSession(credentials)
+    adapter = HTTPAdapter(pool_connections=GCS_POOL_SIZE, pool_maxsize=GCS_POOL_SIZE)
+    session.mount("https://", adapter)
+    project = os.getenv("PROJECT_ID") or default_project
+    return storage.Client(project=project, credentials=credentials, _http=session)
+
 class GCSManager:
     def __init__(self, bucket_name="clinic_sim"):
         """
@@ -21,7 +42,7 @@ class GCSManager:
         self.bucket_name = bucket_name or os.getenv("BUCKET_NAME", "clinic_sim")
         
         try:
-            self.storage_client = storage.Client(project=self.project_id)
+            self.storage_client = get_storage_client()
             self.bucket = self.storage_client.bucket(self.bucket_name)
             logger.info(f"✅ Connected to GCS Bucket: {self.bucket_name}")
         except Exception as e:
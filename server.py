@@ -1,31 +1,154 @@
 # --- server.py ---
 import os
+import copy
 import json
+import orjson
 import logging
-import traceback
+import time
+import queue
+import threading
+import atexit
+import functools
+from logging.handlers import QueueHandler, QueueListener
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, Response, HTMLResponse
+from fastapi.responses import Response, HTMLResponse, StreamingResponse
 from pydantic import BaseModel
-from google.cloud import storage
+from google.api_core.exceptions import NotFound, PreconditionFailed, RequestRangeNotSatisfiable
 from dotenv import load_dotenv
 import asyncio
-import threading
+from concurrent.futures import ThreadPoolExecutor
 from transcriber_engine_new import TranscriberEngine
-from utils import fetch_gcs_text_internal # Assuming this helper exists
+from gcs_manager import get_storage_client
+from utils import fetch_gcs_text_internal, invalidate_gcs_text, send_ws_json
 # --- Local Modules ---
 from simulation import SimulationManager
 import simulation_scenario
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+# Records are handed to a background QueueListener so formatting (including
+# tracebacks) and stderr writes never run on the event loop.
+class _DeferredQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # Same process, so skip QueueHandler's eager formatting; the listener formats
+        return record
+
+class _DuplicateFilter(logging.Filter):
+    """
+    Rate-limits repeated WARNING+ log calls to one per `window` seconds (e.g. reconnect
+    storms). The next emitted copy reports how many repeats were suppressed.
+    """
+    def __init__(self, window=1.0, level=logging.WARNING):
+        super().__init__()
+        self.window = window
+        self.level = level
+        self._state = {}  # key -> [last_emitted, suppressed_count]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < self.level:
+            return True
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            state = self._state.get(key)
+            if state is not None and now - state[0] < self.window:
+                state[1] += 1
+                return False
+            suppressed = state[1] if state else 0
+            if len(self._state) > 1024:
+                self._state.clear()
+            self._state[key] = [now, 0]
+        if suppressed:
+            record.msg = f"{record.msg} (suppressed {suppressed} repeats)"
+        return True
+
+_log_queue = queue.SimpleQueue()
+_queue_handler = _DeferredQueueHandler(_log_queue)
+_queue_handler.addFilter(_DuplicateFilter())
+_stream_handler = logging.StreamHandler()
+_stream_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+_log_listener = QueueListener(_log_queue, _stream_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+logging.basicConfig(level=logging.INFO, handlers=[_queue_handler], force=True)
 logger = logging.getLogger("medforce-backend")
 import sys
 load_dotenv()
 if sys.platform == 'win32':
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+else:
+    # uvloop lowers per-callback overhead on the audio websocket paths
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        logger.warning("uvloop not installed; using default asyncio event loop")
+
+# --- Seed Question Bank ---
+# Loaded once at import; each session seeds its pool from a deep copy rather
+# than re-reading questions.json. The engine still persists that pool (and
+# loads the education pool) from disk, so it is built off the event loop.
+with open("questions.json", "r") as file:
+    _QUESTIONS = json.load(file)
+
+# --- Simulation Scripts ---
+# Parsed once at import instead of on every /ws/simulation/audio connect
+SIMULATION_SCRIPT = "scenario_dumps/transcript.json"
+_SCRIPTS = {path: simulation_scenario.load_script(path) for path in (SIMULATION_SCRIPT,)}
+
+# --- STT Worker Pool ---
+# Bounded pool for engine.stt_loop so sessions can't spawn unlimited threads.
+# Each submitted stt_loop holds one _STT_SLOTS permit until its future completes,
+# so there are never more loops than workers. New sessions past that are turned
+# away rather than left queued with their audio dropping.
+STT_MAX_WORKERS = int(os.getenv("STT_MAX_WORKERS", "32"))
+_STT_EXECUTOR = ThreadPoolExecutor(max_workers=STT_MAX_WORKERS, thread_name_prefix="STT")
+_STT_SLOTS = asyncio.Semaphore(STT_MAX_WORKERS)
+
+def _release_stt_slot_when_done(future, loop):
+    """Returns the permit on the event loop once stt_loop has actually exited."""
+    def _release(_future):
+        try:
+            loop.call_soon_threadsafe(_STT_SLOTS.release)
+        except RuntimeError:
+            pass  # Loop already closed during shutdown
+    future.add_done_callback(_release)
+
+# --- Shared GCS Client ---
+# Built once so every admin request reuses the same credentials and
+# pooled HTTPS connections instead of re-handshaking per call.
+BUCKET_NAME = "clinic_sim"
+
+_STORAGE = get_storage_client()
+_BUCKET = _STORAGE.bucket(BUCKET_NAME)
+
+class ORJSONResponse(Response):
+    """
+    JSON response rendered with orjson. Defined here rather than imported from
+    fastapi.responses, where ORJSONResponse is deprecated in current releases.
+    """
+    media_type = "application/json"
 
-app = FastAPI()
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Cache the static Admin UI once instead of reading it per request
+    try:
+        # Ensure admin_ui.html is in the same directory as server.py
+        with open("admin_ui.html", "r", encoding="utf-8") as f:
+            app.state.admin_html = f.read()
+    except FileNotFoundError:
+        logger.warning("admin_ui.html not found; /admin will return 404")
+        app.state.admin_html = None
+    yield
+    _STT_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -35,6 +158,177 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# GCS JSON API accepts at most 100 calls per batch request
+GCS_BATCH_LIMIT = 100
+
+def _delete_blobs_batched(blobs):
+    """Deletes blobs using GCS batch requests (one HTTP call per 100 blobs)."""
+    for i in range(0, len(blobs), GCS_BATCH_LIMIT):
+        with _STORAGE.batch():
+            for blob in blobs[i:i + GCS_BATCH_LIMIT]:
+                blob.delete()
+
+# Coalesce ~20ms websocket frames into ~100ms chunks before handing them to
+# the STT engine, so each client does fewer cross-thread queue handoffs.
+AUDIO_BATCH_BYTES = 4096
+AUDIO_BATCH_SEC = 0.1
+
+class AudioBatcher:
+    """Per-connection buffer that flushes audio to the engine by size or age."""
+    def __init__(self, engine, max_bytes=AUDIO_BATCH_BYTES, max_delay=AUDIO_BATCH_SEC):
+        self.engine = engine
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self.buffer = bytearray()
+        self._timer = None
+
+    def add(self, chunk):
+        self.buffer.extend(chunk)
+        if len(self.buffer) >= self.max_bytes:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.max_delay)
+        self._timer = None
+        self.flush()
+
+    def flush(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        if self.buffer and self.engine.running:
+            self.engine.add_audio(bytes(self.buffer))
+        self.buffer.clear()
+
+    def close(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        self.buffer.clear()
+
+# Binary downloads are streamed in ranged chunks so memory stays O(chunk).
+# Files up to one chunk are served in a single GCS request.
+GCS_STREAM_CHUNK = 1024 * 1024
+
+def _download_range(blob, start, generation=None):
+    """Fetches one chunk; a short (or empty) result means EOF was reached."""
+    end = start + GCS_STREAM_CHUNK - 1
+    try:
+        return blob.download_as_bytes(
+            start=start, end=end, checksum=None, if_generation_match=generation
+        )
+    except RequestRangeNotSatisfiable:
+        # Object size was an exact multiple of the chunk size
+        return b""
+
+async def _stream_blob(blob, media_type):
+    """
+    Streams a blob to the client chunk by chunk.
+    The first chunk is read eagerly so NotFound still surfaces before the response starts.
+    Later chunks are pinned to the first chunk's generation, so an overwrite mid-download
+    aborts the stream instead of mixing bytes from two object versions.
+    """
+    first = await asyncio.to_thread(_download_range, blob, 0)
+    if len(first) < GCS_STREAM_CHUNK:
+        return Response(content=first, media_type=media_type)
+    generation = blob.generation
+
+    async def iter_chunks():
+        chunk, offset = first, 0
+        while True:
+            yield chunk
+            if len(chunk) < GCS_STREAM_CHUNK:
+                return
+            offset += len(chunk)
+            chunk = await asyncio.to_thread(_download_range, blob, offset, generation)
+            if not chunk:
+                return
+
+    return StreamingResponse(iter_chunks(), media_type=media_type)
+
+def _list_prefixes(prefix):
+    """Returns the common prefixes ('folders') directly under prefix, without object metadata."""
+    iterator = _STORAGE.list_blobs(
+        BUCKET_NAME,
+        prefix=prefix,
+        delimiter="/",
+        fields="prefixes,nextPageToken",
+        page_size=1000,
+    )
+    prefixes = set()
+    for page in iterator.pages:
+        prefixes.update(page.prefixes)
+    return prefixes
+
+class WSSession:
+    """Cleanup hooks for one websocket connection; they run exactly once on exit."""
+    def __init__(self):
+        self._callbacks = []
+
+    def on_stop(self, callback):
+        self._callbacks.append(callback)
+
+    def stop(self):
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in reversed(callbacks):
+            try:
+                callback()
+            except Exception:
+                logger.exception("WebSocket cleanup error")
+
+@asynccontextmanager
+async def ws_session(websocket: WebSocket, name: str):
+    """
+    Accepts the websocket and owns its error handling and teardown.
+    Stop hooks are plain flag flips (and may cancel loop tasks), so they run inline.
+    """
+    await websocket.accept()
+    session = WSSession()
+    try:
+        yield session
+    except WebSocketDisconnect:
+        logger.info(f"👋 {name} client disconnected")
+    except Exception as e:
+        logger.exception(f"❌ {name} WebSocket Error: {e}")
+    finally:
+        session.stop()
+
+# --- WebSocket Admission Control ---
+# Shared cap across all websocket endpoints; extra clients get a clean
+# 1013 (Try Again Later) close instead of dragging the whole server down.
+WS_MAX = int(os.getenv("WS_MAX", "200"))
+_WS_SEM = asyncio.Semaphore(WS_MAX)
+
+try:
+    from prometheus_client import Counter, make_asgi_app
+    _WS_REJECTED = Counter("ws_rejected_total", "WebSocket connections rejected at the WS_MAX limit")
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    _WS_REJECTED = None
+    PROMETHEUS_AVAILABLE = False
+    logger.warning("prometheus_client not installed; ws_rejected_total will not be exported")
+
+def ws_limited(handler):
+    """Gates a websocket endpoint behind the shared connection semaphore."""
+    @functools.wraps(handler)
+    async def wrapper(websocket: WebSocket):
+        if _WS_SEM.locked():
+            logger.warning(f"🚫 WebSocket limit ({WS_MAX}) reached, rejecting {websocket.url.path}")
+            if _WS_REJECTED is not None:
+                _WS_REJECTED.inc()
+            # Accept first so the client receives a real close frame with the code
+            await websocket.accept()
+            await websocket.close(code=1013)
+            return
+        async with _WS_SEM:
+            await handler(websocket)
+    return wrapper
+
+if PROMETHEUS_AVAILABLE:
+    app.mount("/metrics", make_asgi_app())
+
 # --- Pydantic Models ---
 
 class PatientFileRequest(BaseModel):
@@ -53,14 +347,12 @@ class AdminPatientRequest(BaseModel):
 # --- Endpoints ---
 
 @app.websocket("/ws/simulation/audio")
+@ws_limited
 async def websocket_simulation_audio_endpoint(websocket: WebSocket):
     """
     WebSocket endpoint for Scripted/Audio-only simulation.
     """
-    await websocket.accept()
-    
-    manager = None 
-    try:
+    async with ws_session(websocket, "Audio Simulation") as session:
         # Wait for the initial configuration message
         data = await websocket.receive_json()
 
@@ -73,20 +365,17 @@ async def websocket_simulation_audio_endpoint(websocket: WebSocket):
             
             logger.info(f"🎧 Starting Audio Simulation for {patient_id} using {script_file}")
             
-            manager = simulation_scenario.SimulationAudioManager(websocket, patient_id, script_file="scenario_dumps/transcript.json")
+            manager = simulation_scenario.SimulationAudioManager(
+                websocket,
+                patient_id,
+                script_file=SIMULATION_SCRIPT,
+                script_data=_SCRIPTS[SIMULATION_SCRIPT]
+            )
+            session.on_stop(manager.stop)
             await manager.run()
-            
-    except WebSocketDisconnect:
-        logger.info("Audio Simulation Client disconnected")
-        if manager:
-            manager.stop()
-    except Exception as e:
-        traceback.print_exc()
-        logger.error(f"Audio Simulation WebSocket Error: {e}")
-        if manager:
-            manager.stop()
 
 @app.websocket("/ws/transcriber")
+@ws_limited
 async def websocket_transcriber_endpoint(websocket: WebSocket):
     """
     Main entry point for the AI Transcriber.
@@ -94,94 +383,111 @@ async def websocket_transcriber_endpoint(websocket: WebSocket):
     - Receives raw audio (Bytes) to process.
     - Pushes AI updates (JSON) back to the frontend.
     """
-    with open("questions.json", "r") as file:
-        # Load the contents into a Python dictionary or list
-        questions = json.load(file)
-    with open("question_pool.json", "w") as file:
-        # 'indent=4' makes the file human-readable
-        json.dump(questions, file, indent=4)
-
-    with open("education_pool.json", "w") as file:
-        # 'indent=4' makes the file human-readable
-        json.dump([], file, indent=4)
-
+    async with ws_session(websocket, "Transcriber") as session:
+        main_loop = asyncio.get_running_loop()
+        engine = None
+        batcher = None
+
+        def cleanup():
+            # Reads the current bindings; earlier engines are stopped on restart
+            if batcher:
+                batcher.close()
+            if engine:
+                logger.info("🧹 Stopping Transcriber Engine...")
+                engine.stop()
+        session.on_stop(cleanup)
+
+        logger.info("🔌 Frontend connected to /ws/transcriber")
 
-    await websocket.accept()
-    
-    main_loop = asyncio.get_running_loop()
-    engine = None
-
-    logger.info("🔌 Frontend connected to /ws/transcriber")
-
-    try:
         while True:
             # Wait for any message (JSON or Binary)
             message = await websocket.receive()
 
-            # --- 1. HANDLE JSON COMMANDS ---
-            if "text" in message:
-                try:
-                    data = json.loads(message["text"])
-                    
-                    # CASE A: Manual Stop Signal {"status": True}
-                    if data.get("status") is True:
-                        logger.info("🛑 Frontend requested End of Consultation.")
-                        if engine:
-                            engine.finish_consultation()
-                        else:
-                            logger.warning("Frontend sent stop signal, but engine is not running.")
-
-                    # CASE B: Start Signal
-                    elif data.get("type") == "start":
-                        patient_id = data.get("patient_id", "P0001")
+            # --- 1. HANDLE BINARY AUDIO DATA (hot path, checked first) ---
+            chunk = message.get("bytes")
+            if chunk is not None:
+                if engine and engine.running:
+                    batcher.add(chunk)
+                continue
+
+            text = message.get("text")
+            if text is None:
+                if message["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(message.get("code", 1000))
+                continue
+
+            # --- 2. HANDLE JSON COMMANDS ---
+            try:
+                data = orjson.loads(text)
+            
+                # CASE A: Manual Stop Signal {"status": True}
+                if data.get("status") is True:
+                    logger.info("🛑 Frontend requested End of Consultation.")
+                    if engine:
+                        engine.finish_consultation()
+                    else:
+                        logger.warning("Frontend sent stop signal, but engine is not running.")
+
+                # CASE B: Start Signal
+                elif data.get("type") == "start":
+                    patient_id = data.get("patient_id", "P0001")
+
+                    # New sessions are turned away when every STT worker is taken
+                    if engine is None and _STT_SLOTS.locked():
+                        logger.warning(f"🚫 STT capacity ({STT_MAX_WORKERS}) reached, rejecting {patient_id}")
+                        await send_ws_json(websocket, {
+                            "type": "system",
+                            "message": "Transcriber busy, please try again later"
+                        })
+                        await websocket.close(code=1013)
+                        return
+
+                    # A repeated "start" replaces the session; stop the old engine first so
+                    # its stt_loop exits and frees the pool worker
+                    if batcher:
+                        batcher.close()
+                        batcher = None
+                    if engine:
+                        engine.stop()
+
+                    # On restart this waits for a permit, i.e. until a loop (usually the old one) exits
+                    await _STT_SLOTS.acquire()
+                    try:
                         logger.info(f"🚀 Starting Transcriber Engine for {patient_id}")
-                        
-                        patient_info = fetch_gcs_text_internal(patient_id, "patient_info.md")
-                        
-                        engine = TranscriberEngine(
+
+                        patient_info = await asyncio.to_thread(fetch_gcs_text_internal, patient_id, "patient_info.md")
+
+                        # Constructor does file I/O (pool files, GCS client), so keep it off the loop
+                        engine = await asyncio.to_thread(
+                            TranscriberEngine,
                             patient_id=patient_id,
                             patient_info=patient_info,
                             websocket=websocket,
-                            loop=main_loop
+                            loop=main_loop,
+                            # Each session mutates its own copy of the seed questions
+                            initial_questions=copy.deepcopy(_QUESTIONS)
                         )
-                        
-                        stt_thread = threading.Thread(
-                            target=engine.stt_loop, 
-                            daemon=True,
-                            name=f"STT_{patient_id}"
-                        )
-                        stt_thread.start()
-                        
-                        await websocket.send_json({
-                            "type": "system", 
-                            "message": f"Transcriber initialized for {patient_id}"
-                        })
+                    except BaseException:
+                        _STT_SLOTS.release()
+                        raise
+                    batcher = AudioBatcher(engine)
 
-                except json.JSONDecodeError:
-                    logger.error("Received invalid JSON from frontend")
+                    # The permit is returned only when this stt_loop's future completes
+                    _release_stt_slot_when_done(engine.start_stt(_STT_EXECUTOR), main_loop)
 
-            # --- 2. HANDLE BINARY AUDIO DATA ---
-            elif "bytes" in message:
-                if engine and engine.running:
-                    engine.add_audio(message["bytes"])
+                    await send_ws_json(websocket, {
+                        "type": "system", 
+                        "message": f"Transcriber initialized for {patient_id}"
+                    })
 
-    except WebSocketDisconnect:
-        logger.info("👋 Frontend disconnected from /ws/transcriber")
-    except Exception as e:
-        logger.error(f"❌ Transcriber WebSocket Error: {e}")
-        traceback.print_exc()
-    finally:
-        if engine:
-            logger.info("🧹 Stopping Transcriber Engine...")
-            engine.stop()
+            except orjson.JSONDecodeError:
+                logger.error("Received invalid JSON from frontend")
 
 
 @app.websocket("/ws/simulation")
+@ws_limited
 async def websocket_endpoint(websocket: WebSocket):
-    await websocket.accept()
-    
-    manager = None 
-    try:
+    async with ws_session(websocket, "Simulation") as session:
         data = await websocket.receive_json()
 
         if isinstance(data, dict) and data.get("type") == "start":
@@ -189,72 +495,53 @@ async def websocket_endpoint(websocket: WebSocket):
             gender = data.get("gender", "Male")
             
             manager = SimulationManager(websocket, patient_id, gender)
+            session.on_stop(manager.stop)
             await manager.run()
-            
-    except WebSocketDisconnect:
-        logger.info("Client disconnected")
-        if manager:
-            manager.running = False
-            if hasattr(manager, 'logic_thread'): 
-                manager.logic_thread.stop()
-    except Exception as e:
-        traceback.print_exc()
-        logger.error(f"WebSocket Error: {e}")
-        if manager:
-            manager.running = False
 
 @app.get("/admin", response_class=HTMLResponse)
 async def get_admin_ui():
-    """Serves the Admin UI HTML file."""
-    try:
-        # Ensure admin_ui.html is in the same directory as server.py
-        with open("admin_ui.html", "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
+    """Serves the Admin UI HTML file (cached at startup)."""
+    if app.state.admin_html is None:
         return HTMLResponse(content="<h1>Error: admin_ui.html not found on server.</h1>", status_code=404)
+    return HTMLResponse(content=app.state.admin_html)
 
 
 @app.post("/api/get-patient-file")
-def get_patient_file(request: PatientFileRequest):
+async def get_patient_file(request: PatientFileRequest):
     """
     Retrieves a file from gs://clinic_sim/patient_profile/{pid}/{file_name}
     """
-    BUCKET_NAME = "clinic_sim"
     blob_path = f"patient_profile/{request.pid}/{request.file_name}"
     
     logger.info(f"📥 Fetching GCS: gs://{BUCKET_NAME}/{blob_path}")
 
     try:
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(BUCKET_NAME)
-        blob = bucket.blob(blob_path)
-
-        if not blob.exists():
-            logger.warning(f"File not found: {blob_path}")
-            return JSONResponse(
-                status_code=404, 
-                content={"error": "File not found", "path": blob_path}
-            )
-
+        blob = _BUCKET.blob(blob_path)
         file_ext = request.file_name.lower().split('.')[-1]
 
         if file_ext == 'json':
-            content = blob.download_as_text()
-            return JSONResponse(content=json.loads(content))
+            # Stored JSON is passed through as-is; no decode/re-encode round trip
+            content = await asyncio.to_thread(blob.download_as_bytes)
+            return Response(content=content, media_type="application/json")
         elif file_ext in ['md', 'txt']:
-            content = blob.download_as_text()
+            content = await asyncio.to_thread(blob.download_as_text)
             return Response(content=content, media_type="text/markdown")
         elif file_ext in ['png', 'jpg', 'jpeg']:
-            content = blob.download_as_bytes()
             media_type = "image/png" if file_ext == 'png' else "image/jpeg"
-            return Response(content=content, media_type=media_type)
+            return await _stream_blob(blob, media_type)
         else:
-            content = blob.download_as_bytes()
-            return Response(content=content, media_type="application/octet-stream")
-
+            return await _stream_blob(blob, "application/octet-stream")
+
+    except NotFound:
+        # Download directly and map a missing object to 404, instead of a HEAD first
+        logger.warning(f"File not found: {blob_path}")
+        return ORJSONResponse(
+            status_code=404, 
+            content={"error": "File not found", "path": blob_path}
+        )
     except Exception as e:
         logger.error(f"GCS API Error: {e}")
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=500, 
             content={"error": str(e)}
         )
@@ -265,139 +552,137 @@ def get_patient_file(request: PatientFileRequest):
 # ==========================================
 
 @app.get("/api/admin/list-files/{pid}")
-def list_patient_files(pid: str):
+async def list_patient_files(pid: str):
     """Lists all files in GCS for a specific patient ID."""
-    BUCKET_NAME = "clinic_sim"
     prefix = f"patient_profile/{pid}/"
     
     try:
-        storage_client = storage.Client()
-        blobs = storage_client.list_blobs(BUCKET_NAME, prefix=prefix)
+        # list_blobs pages lazily, so materialize it off the event loop.
+        # fields= trims each listed object down to the three attributes used below.
+        blobs = await asyncio.to_thread(
+            lambda: list(_STORAGE.list_blobs(
+                BUCKET_NAME,
+                prefix=prefix,
+                fields="items(name,size,updated),nextPageToken"
+            ))
+        )
         
-        file_list = []
-        for blob in blobs:
-            # Remove the prefix from the name for cleaner UI
-            clean_name = blob.name.replace(prefix, "")
-            if clean_name: # Avoid listing the directory itself
-                file_list.append({
-                    "name": clean_name,
-                    "full_path": blob.name,
-                    "size": blob.size,
-                    "updated": blob.updated.isoformat() if blob.updated else None
-                })
+        # Strip the prefix for a cleaner UI and skip the directory placeholder itself
+        prefix_len = len(prefix)
+        file_list = [
+            {
+                "name": name,
+                "full_path": blob.name,
+                "size": blob.size,
+                "updated": blob.updated.isoformat() if blob.updated else None
+            }
+            for blob in blobs
+            if (name := blob.name[prefix_len:])
+        ]
         
-        return JSONResponse(content={"files": file_list})
+        return ORJSONResponse(content={"files": file_list})
     except Exception as e:
         logger.error(f"List Files Error: {e}")
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        return ORJSONResponse(status_code=500, content={"error": str(e)})
 
 @app.post("/api/admin/save-file")
-def save_patient_file(request: AdminFileSaveRequest):
+async def save_patient_file(request: AdminFileSaveRequest):
     """Creates or Updates a text-based file."""
-    BUCKET_NAME = "clinic_sim"
     blob_path = f"patient_profile/{request.pid}/{request.file_name}"
     
     try:
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(BUCKET_NAME)
-        blob = bucket.blob(blob_path)
+        blob = _BUCKET.blob(blob_path)
         
         # Upload content (Text/Markdown/JSON)
-        blob.upload_from_string(request.content, content_type="text/plain")
+        await asyncio.to_thread(blob.upload_from_string, request.content, content_type="text/plain")
         
+        invalidate_gcs_text(request.pid, request.file_name)
         logger.info(f"💾 Saved file: {blob_path}")
-        return JSONResponse(content={"message": "File saved successfully", "path": blob_path})
+        return ORJSONResponse(content={"message": "File saved successfully", "path": blob_path})
     except Exception as e:
         logger.error(f"Save File Error: {e}")
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        return ORJSONResponse(status_code=500, content={"error": str(e)})
 
 @app.delete("/api/admin/delete-file")
-def delete_patient_file(pid: str, file_name: str):
+async def delete_patient_file(pid: str, file_name: str):
     """Deletes a file."""
-    BUCKET_NAME = "clinic_sim"
     blob_path = f"patient_profile/{pid}/{file_name}"
     
     try:
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(BUCKET_NAME)
-        blob = bucket.blob(blob_path)
+        blob = _BUCKET.blob(blob_path)
         
-        if blob.exists():
-            blob.delete()
-            logger.info(f"🗑️ Deleted file: {blob_path}")
-            return JSONResponse(content={"message": "File deleted successfully"})
-        else:
-            return JSONResponse(status_code=404, content={"error": "File not found"})
-            
+        await asyncio.to_thread(blob.delete)
+        invalidate_gcs_text(pid, file_name)
+        logger.info(f"🗑️ Deleted file: {blob_path}")
+        return ORJSONResponse(content={"message": "File deleted successfully"})
+
+    except NotFound:
+        return ORJSONResponse(status_code=404, content={"error": "File not found"})
     except Exception as e:
         logger.error(f"Delete File Error: {e}")
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        return ORJSONResponse(status_code=500, content={"error": str(e)})
 
 @app.get("/api/admin/list-patients")
-def list_patients():
+async def list_patients():
     """Lists all 'folders' (prefixes) under patient_profile/"""
-    BUCKET_NAME = "clinic_sim"
     prefix = "patient_profile/"
     
     try:
-        storage_client = storage.Client()
-        # Using delimiter='/' mimics directory listing
-        blobs = storage_client.list_blobs(BUCKET_NAME, prefix=prefix, delimiter="/")
-        
-        # We must iterate over the iterator to populate .prefixes
-        list(blobs) 
+        # Using delimiter='/' mimics directory listing; fields= asks GCS for prefixes only
+        prefixes = await asyncio.to_thread(_list_prefixes, prefix)
         
         patients = []
-        for p in blobs.prefixes:
+        for p in sorted(prefixes):
             # p comes back as "patient_profile/p001/" -> we want "p001"
             parts = p.rstrip('/').split('/')
             if parts:
                 patients.append(parts[-1])
                 
-        return JSONResponse(content={"patients": patients})
+        return ORJSONResponse(content={"patients": patients})
     except Exception as e:
         logger.error(f"List Patients Error: {e}")
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        return ORJSONResponse(status_code=500, content={"error": str(e)})
 
 @app.post("/api/admin/create-patient")
-def create_patient(request: AdminPatientRequest):
+async def create_patient(request: AdminPatientRequest):
     """Creates a new patient folder by creating an initial empty file."""
-    BUCKET_NAME = "clinic_sim"
     # GCS folders don't exist without files. We create a default info file.
     blob_path = f"patient_profile/{request.pid}/patient_info.md"
     
     try:
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(BUCKET_NAME)
-        blob = bucket.blob(blob_path)
+        blob = _BUCKET.blob(blob_path)
         
-        if blob.exists():
-             return JSONResponse(status_code=400, content={"error": "Patient already exists"})
-
-        blob.upload_from_string("# Patient Profile\nName: \nAge: ", content_type="text/markdown")
+        # if_generation_match=0 makes GCS reject the upload when the object already exists
+        await asyncio.to_thread(
+            blob.upload_from_string,
+            "# Patient Profile\nName: \nAge: ",
+            content_type="text/markdown",
+            if_generation_match=0,
+        )
+        invalidate_gcs_text(request.pid, "patient_info.md")
         
-        return JSONResponse(content={"message": "Patient created", "pid": request.pid})
+        return ORJSONResponse(content={"message": "Patient created", "pid": request.pid})
+    except PreconditionFailed:
+        return ORJSONResponse(status_code=400, content={"error": "Patient already exists"})
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        return ORJSONResponse(status_code=500, content={"error": str(e)})
 
 @app.delete("/api/admin/delete-patient")
-def delete_patient(pid: str):
+async def delete_patient(pid: str):
     """Deletes a patient folder and ALL files inside it."""
-    BUCKET_NAME = "clinic_sim"
     prefix = f"patient_profile/{pid}/"
     
     try:
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(BUCKET_NAME)
-        blobs = list(bucket.list_blobs(prefix=prefix))
+        blobs = await asyncio.to_thread(lambda: list(_BUCKET.list_blobs(prefix=prefix)))
         
         if not blobs:
-            return JSONResponse(status_code=404, content={"error": "Patient not found"})
+            return ORJSONResponse(status_code=404, content={"error": "Patient not found"})
 
-        bucket.delete_blobs(blobs)
+        await asyncio.to_thread(_delete_blobs_batched, blobs)
+        invalidate_gcs_text(pid)
         logger.info(f"🗑️ Deleted patient folder: {prefix}")
-        return JSONResponse(content={"message": f"Deleted {len(blobs)} files for patient {pid}"})
+        return ORJSONResponse(content={"message": f"Deleted {len(blobs)} files for patient {pid}"})
             
     except Exception as e:
         logger.error(f"Delete Patient Error: {e}")
-        return JSONResponse(status_code=500, content={"error": str(e)})
\ No newline at end of file
+        return ORJSONResponse(status_code=500, content={"error": str(e)})
\ No newline at end of file
@@ -12,7 +12,7 @@ from fastapi import WebSocket
 import question_manager
 # Local Imports
 import agents
-from utils import fetch_gcs_text_internal
+from utils import fetch_gcs_text_internal, send_ws_json
 
 logger = logging.getLogger("medforce-backend")
 
@@ -243,7 +243,7 @@ class SimulationManager:
 
     async def run(self):
         self.running = True
-        await self.websocket.send_json({"type": "system", "message": "Initializing Agents..."})
+        await send_ws_json(self.websocket, {"type": "system", "message": "Initializing Agents..."})
 
         # --- ASYNC CONTEXT MANAGER FOR GEMINI LIVE CONNECTIONS ---
         async with contextlib.AsyncExitStack() as stack:
@@ -254,7 +254,7 @@ class SimulationManager:
             self.nurse.set_session(nurse_session)
             self.patient.set_session(patient_session)
             
-            await self.websocket.send_json({"type": "system", "message": "Voice sessions connected."})
+            await send_ws_json(self.websocket, {"type": "system", "message": "Voice sessions connected."})
             await asyncio.sleep(2)
 
             # Initial State
@@ -292,7 +292,7 @@ class SimulationManager:
                 self.tm.log("PATIENT", patient_last_words)
                 
                 # Signal UI that a full exchange happened
-                await self.websocket.send_json({"type": "turn", "data": "finish cycle"})
+                await send_ws_json(self.websocket, {"type": "turn", "data": "finish cycle"})
 
                 # 3. CLINICAL INTELLIGENCE SYNC
                 # We wait a moment for the ws_transcriber.py to process the audio and update the JSON
@@ -310,7 +310,7 @@ class SimulationManager:
                 logger.info("SIMULATION : Next Instruction: " + next_instruction)
 
 
-                await self.websocket.send_json({
+                await send_ws_json(self.websocket, {
                     "type": "system", 
                     "message": f"Clinical Instruction: {next_instruction}"
                 })
@@ -329,13 +329,13 @@ class SimulationManager:
                     break
 
             # Send final stop signals
-            await self.websocket.send_json({"type": "turn", "data": "end"})
+            await send_ws_json(self.websocket, {"type": "turn", "data": "end"})
             self.running = False
             logger.info("🛑 Simulation Loop Terminated.")
 
     async def run2(self):
         self.running = True
-        await self.websocket.send_json({"type": "system", "message": "Initializing Agents..."})
+        await send_ws_json(self.websocket, {"type": "system", "message": "Initializing Agents..."})
 
         # --- ASYNC CONTEXT MANAGER FOR GEMINI LIVE CONNECTIONS ---
         async with contextlib.AsyncExitStack() as stack:
@@ -346,7 +346,7 @@ class SimulationManager:
             self.nurse.set_session(nurse_session)
             self.patient.set_session(patient_session)
             
-            await self.websocket.send_json({"type": "system", "message": "Voice sessions connected."})
+            await send_ws_json(self.websocket, {"type": "system", "message": "Voice sessions connected."})
             await asyncio.sleep(2)
 
             # Initial State
@@ -384,14 +384,14 @@ class SimulationManager:
                 self.tm.log("PATIENT", patient_last_words)
                 
                 # Signal UI that a full exchange happened
-                await self.websocket.send_json({"type": "turn", "data": "finish cycle"})
+                await send_ws_json(self.websocket, {"type": "turn", "data": "finish cycle"})
 
 
-                await self.websocket.send_json({"type": "diagnosis", "diagnosis": None})
-                await self.websocket.send_json({"type": "questions", "questions": None})
-                await self.websocket.send_json({"type": "analytics", "data": None})
-                await self.websocket.send_json({"type": "status", "data": None})
-                await self.websocket.send_json({"type": "education", "data": None})
+                await send_ws_json(self.websocket, {"type": "diagnosis", "diagnosis": None})
+                await send_ws_json(self.websocket, {"type": "questions", "questions": None})
+                await send_ws_json(self.websocket, {"type": "analytics", "data": None})
+                await send_ws_json(self.websocket, {"type": "status", "data": None})
+                await send_ws_json(self.websocket, {"type": "education", "data": None})
                 # 3. CLINICAL INTELLIGENCE SYNC
                 # We wait a moment for the ws_transcriber.py to process the audio and update the JSON
                 await asyncio.sleep(1.5)
@@ -408,7 +408,7 @@ class SimulationManager:
                 logger.info("SIMULATION : Next Instruction: " + next_instruction)
 
 
-                await self.websocket.send_json({
+                await send_ws_json(self.websocket, {
                     "type": "system", 
                     "message": f"Clinical Instruction: {next_instruction}"
                 })
@@ -427,7 +427,7 @@ class SimulationManager:
                     break
 
             # Send final stop signals
-            await self.websocket.send_json({"type": "turn", "data": "end"})
+            await send_ws_json(self.websocket, {"type": "turn", "data": "end"})
             self.running = False
             logger.info("🛑 Simulation Loop Terminated.")
 
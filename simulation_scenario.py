@@ -2,12 +2,14 @@
 
 import asyncio
 import json
+import orjson
 import logging
 import datetime
 import os
 import base64
 import time
 from fastapi import WebSocket
+from utils import send_ws_json
 logger = logging.getLogger("medforce-backend-audio")
 
 # Try to import mutagen for accurate audio duration
@@ -35,29 +37,29 @@ class TranscriptManager:
         }
         self.history.append(entry)
 
+def load_script(script_file: str):
+    """Loads the conversation flow from a JSON file, sorted by index."""
+    if not os.path.exists(script_file):
+        logger.error(f"Script file {script_file} not found.")
+        return []
+    try:
+        with open(script_file, 'rb') as f:
+            data = orjson.loads(f.read())
+            return sorted(data, key=lambda x: x.get('index', 0))
+    except Exception as e:
+        logger.error(f"Error loading script: {e}")
+        return []
+
 class SimulationAudioManager:
-    def __init__(self, websocket: WebSocket, patient_id: str, script_file: str = "scenario_script.json"):
+    def __init__(self, websocket: WebSocket, patient_id: str, script_file: str = "scenario_script.json", script_data: list = None):
         self.websocket = websocket
         self.patient_id = patient_id
         self.tm = TranscriptManager()
         self.running = False
         self.script_file = script_file
         
-        # Load the linear script
-        self.script_data = self._load_script()
-
-    def _load_script(self):
-        """Loads the conversation flow from a JSON file."""
-        if not os.path.exists(self.script_file):
-            logger.error(f"Script file {self.script_file} not found.")
-            return []
-        try:
-            with open(self.script_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return sorted(data, key=lambda x: x.get('index', 0))
-        except Exception as e:
-            logger.error(f"Error loading script: {e}")
-            return []
+        # Load the linear script (callers may pass a preloaded, read-only copy)
+        self.script_data = script_data if script_data is not None else load_script(self.script_file)
     
     def _get_audio_duration(self, file_path: str) -> float:
         """Returns duration in seconds."""
@@ -83,7 +85,7 @@ class SimulationAudioManager:
         """Reads an audio file and streams it to the WS in chunks."""
         if not audio_path or not os.path.exists(audio_path):
             logger.warning(f"Audio file not found: {audio_path}")
-            await self.websocket.send_json({
+            await send_ws_json(self.websocket, {
                 "type": "audio", 
                 "speaker": speaker, 
                 "text": text_content, 
@@ -102,7 +104,7 @@ class SimulationAudioManager:
                     
                     encoded_data = base64.b64encode(data).decode('utf-8')
                     
-                    await self.websocket.send_json({
+                    await send_ws_json(self.websocket, {
                         "type": "audio",
                         "speaker": speaker,
                         "data": encoded_data,
@@ -115,7 +117,7 @@ class SimulationAudioManager:
             logger.error(f"Error streaming audio: {e}")
 
         # Send Final Text Packet
-        await self.websocket.send_json({
+        await send_ws_json(self.websocket, {
             "type": "audio",
             "speaker": speaker,
             "data": None,
@@ -134,7 +136,7 @@ class SimulationAudioManager:
                 with open(file_path, "r", encoding="utf-8") as f:
                     data = json.load(f)
                 
-                await self.websocket.send_json({
+                await send_ws_json(self.websocket, {
                     "type": msg_type,
                     data_key: data
                 })
@@ -145,9 +147,9 @@ class SimulationAudioManager:
         self.running = True
         logger.info("▶ Starting Audio Simulation")
         
-        await self.websocket.send_json({"type": "system", "message": "Initializing Audio Script..."})
+        await send_ws_json(self.websocket, {"type": "system", "message": "Initializing Audio Script..."})
         await asyncio.sleep(1)
-        await self.websocket.send_json({"type": "system", "message": "Ready."})
+        await send_ws_json(self.websocket, {"type": "system", "message": "Ready."})
         
         transcript_pool = []
         updates_to_process = [
@@ -199,7 +201,7 @@ class SimulationAudioManager:
             print("After wait")
 
             # --- 4. SEND CHAT HISTORY ---
-            await self.websocket.send_json({
+            await send_ws_json(self.websocket, {
                 "type": "chat", 
                 "questions": transcript_pool
             })
@@ -224,7 +226,7 @@ class SimulationAudioManager:
                     await self._send_scenario_update(folder, prefix, update_index, msg_type, key)
 
             # --- 6. FINISH TURN ---
-            await self.websocket.send_json({"type": "turn", "data": "finish cycle"})
+            await send_ws_json(self.websocket, {"type": "turn", "data": "finish cycle"})
 
             # Check disconnect
             # if self.websocket.client_state.name == "DISCONNECTED": 
@@ -238,14 +240,14 @@ class SimulationAudioManager:
             with open("scenario_dumps/report.json", "r", encoding="utf-8") as f:
                 report = json.load(f)
 
-            await self.websocket.send_json({"type": "checklist", "data": checklist})
-            await self.websocket.send_json({"type": "report", "data": report})
+            await send_ws_json(self.websocket, {"type": "checklist", "data": checklist})
+            await send_ws_json(self.websocket, {"type": "report", "data": report})
         except:
             pass
 
         if self.running:
-            await self.websocket.send_json({"type": "system", "message": "Session Complete."})
-            await self.websocket.send_json({"type": "turn", "data": "end"})
+            await send_ws_json(self.websocket, {"type": "system", "message": "Session Complete."})
+            await send_ws_json(self.websocket, {"type": "turn", "data": "end"})
             self.running = False
             logger.info("🛑 Audio Simulation Ended.")
 
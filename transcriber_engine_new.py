@@ -20,10 +20,16 @@ import diagnosis_manager
 import question_manager
 import education_manager
 from gcs_manager import GCSManager
+from utils import send_ws_json
 
 logger = logging.getLogger("medforce-backend")
 TRANSCRIPT_FILE = "simulation_transcript.txt"
-
+# stt_loop only starts draining the queue after the initial Gemini analysis,
+# which routinely takes 10s+, and the audio sent meanwhile must survive it.
+# server.AudioBatcher sends ~85-100 ms chunks, so 900 chunks is ~90 s of audio.
+MAX_AUDIO_QUEUE = 900
+# Dropped chunks are reported as one summary line per interval
+DROP_LOG_INTERVAL_SEC = 5.0
 # --- NEW AGENT CLASS ---
 
 # --- LOGIC THREAD ---
@@ -79,9 +85,10 @@ class TranscriberLogicThread(threading.Thread):
         self.report_agent = agents.ComprehensiveReportAgent()
         self.q_dedup = agents.QuestionIntegrationGatekeeper()
 
-        # Clear transcript file
+        # Clear transcript file and education pool for this consultation
         with open(TRANSCRIPT_FILE, "w", encoding="utf-8") as f:
             f.write("")
+        self.em.clear_pool()
 
         logger.info(f"🩺 [Logic Thread] Monitoring {TRANSCRIPT_FILE}...")
         loop.run_until_complete(self.start_logic())
@@ -128,7 +135,7 @@ class TranscriberLogicThread(threading.Thread):
     async def _push_to_ui(self, payload):
         if self.websocket and self.main_loop:
             try:
-                asyncio.run_coroutine_threadsafe(self.websocket.send_json(payload), self.main_loop)
+                asyncio.run_coroutine_threadsafe(send_ws_json(self.websocket, payload), self.main_loop)
             except Exception as e:
                 logger.error(f"UI Push Error: {e}")
 
@@ -425,7 +432,7 @@ class TranscriberLogicThread(threading.Thread):
         self.running = False
 
 class TranscriberEngine:
-    def __init__(self, patient_id, patient_info, websocket, loop):
+    def __init__(self, patient_id, patient_info, websocket, loop, initial_questions=None):
         self.websocket = websocket
         self.patient_id = patient_id
         self.patient_info = patient_info
@@ -437,7 +444,11 @@ class TranscriberEngine:
         self.SIMULATION_RATE = 24000
         self.TRANSCRIBER_RATE = 16000
         self.resample_state = None
-        self.audio_queue = queue.Queue()       
+        # Bounded so a stalled STT stream can't grow memory without limit
+        self.audio_queue = queue.Queue(maxsize=MAX_AUDIO_QUEUE)
+        self.dropped_chunks = 0
+        self._drops_since_log = 0
+        self._last_drop_log = 0.0
         self.transcript_memory = []
         self.is_sentence_final = True
 
@@ -445,12 +456,15 @@ class TranscriberEngine:
         self.raw_audio_buffer = bytearray()
         self.buffer_lock = threading.Lock()
 
+        # Future for stt_loop when run on a shared executor
+        self.stt_future = None
+
         # Initialize Logic Thread
         self.logic_thread = TranscriberLogicThread(
             self.patient_id,
             self.patient_info,
             diagnosis_manager.DiagnosisManager(),
-            question_manager.QuestionPoolManager([]),
+            question_manager.QuestionPoolManager(initial_questions or []),
             self.main_loop,
             self.websocket,
             self.transcript_memory,
@@ -469,7 +483,7 @@ class TranscriberEngine:
             
             # 1. Put into STT Queue (for Google Streaming Trigger)
             release_time = time.time() + self.AUDIO_DELAY_SEC
-            self.audio_queue.put((release_time, converted))
+            self._enqueue_audio((release_time, converted))
 
             # 2. Accumulate in Buffer (Piled Up)
             with self.buffer_lock:
@@ -478,6 +492,31 @@ class TranscriberEngine:
         except Exception as e:
             logger.error(f"Resampling Error: {e}")
 
+    def _enqueue_audio(self, item):
+        """Non-blocking put; when full, drops the oldest chunk so STT stays on recent audio."""
+        while True:
+            try:
+                self.audio_queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.audio_queue.get_nowait()
+                    self._record_drop()
+                except queue.Empty:
+                    pass
+
+    def _record_drop(self):
+        self.dropped_chunks += 1
+        self._drops_since_log += 1
+        now = time.monotonic()
+        if now - self._last_drop_log >= DROP_LOG_INTERVAL_SEC:
+            logger.warning(
+                f"⚠️ [Engine] STT queue full, dropped {self._drops_since_log} oldest chunks "
+                f"({self.dropped_chunks} total this session)"
+            )
+            self._drops_since_log = 0
+            self._last_drop_log = now
+
     def get_audio_buffer_copy(self):
         """
         Callback used by Logic Thread to retrieve the FULL piled-up audio.
@@ -489,10 +528,31 @@ class TranscriberEngine:
             # Return a COPY of the bytes
             return bytes(self.raw_audio_buffer)
 
+    def start_stt(self, executor):
+        """Schedules stt_loop on a shared (bounded) executor."""
+        self.stt_future = executor.submit(self.stt_loop)
+        self.stt_future.add_done_callback(self._log_stt_exit)
+        return self.stt_future
+
+    def _log_stt_exit(self, future):
+        """Surfaces stt_loop crashes that the executor would otherwise swallow."""
+        if future.cancelled():
+            return
+        exc = future.exception()
+        if exc is not None:
+            logger.error(f"❌ [STT Loop] {self.patient_id} crashed: {exc!r}", exc_info=exc)
+
     def stt_loop(self):
-        """Google STT Streaming (Used as VAD/Trigger)."""
+        """
+        Google STT Streaming (Used as VAD/Trigger).
+        Recognition runs server-side, so this loop is network-bound and only
+        needs a worker thread (see start_stt), not a separate process.
+        """
         logger.info("⏳ [Engine] Waiting for initial analysis...")
-        self.logic_thread.ready_event.wait()
+        # Poll so a session stopped during analysis releases its pool worker
+        while not self.logic_thread.ready_event.wait(timeout=1.0):
+            if not self.running:
+                return
 
         client = speech.SpeechClient()
         config = speech.RecognitionConfig(
@@ -555,7 +615,7 @@ class TranscriberEngine:
                                 "transcript": list(self.transcript_memory)
                             }
                             asyncio.run_coroutine_threadsafe(
-                                self.websocket.send_json(live_payload),
+                                send_ws_json(self.websocket, live_payload),
                                 self.main_loop
                             )
                         except Exception:
@@ -579,4 +639,7 @@ class TranscriberEngine:
     def stop(self):
         self.running = False
         self.logic_thread.stop()
-        self.audio_queue.put(None)
\ No newline at end of file
+        # Frees the slot if stt_loop was still queued behind other sessions
+        if self.stt_future:
+            self.stt_future.cancel()
+        self._enqueue_audio(None)
\ No newline at end of file
@@ -1,23 +1,57 @@
 # --- utils.py ---
 import logging
-from google.cloud import storage
+import threading
+import orjson
+from cachetools import TTLCache
+from google.api_core.exceptions import NotFound
+from gcs_manager import get_storage_client
 
 logger = logging.getLogger("medforce-backend")
 
+# Read-mostly profile files are cached briefly to skip repeat GCS round trips.
+# Admin writes/deletes call invalidate_gcs_text() so edits show up immediately.
+_TEXT_CACHE = TTLCache(maxsize=512, ttl=60)
+_TEXT_CACHE_LOCK = threading.Lock()
+
 def fetch_gcs_text_internal(pid: str, filename: str) -> str:
     """Fetches text content from GCS for internal logic use."""
     BUCKET_NAME = "clinic_sim"
+    key = (pid, filename)
+    with _TEXT_CACHE_LOCK:
+        cached = _TEXT_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    blob_path = f"patient_profile/{pid}/{filename}"
     try:
-        storage_client = storage.Client()
+        storage_client = get_storage_client()
         bucket = storage_client.bucket(BUCKET_NAME)
-        blob_path = f"patient_profile/{pid}/{filename}"
         blob = bucket.blob(blob_path)
-        
-        if not blob.exists():
-            logger.warning(f"File not found in GCS: {blob_path}")
-            return f"System: Error - File {filename} not found."
-            
-        return blob.download_as_text()
+
+        content = blob.download_as_text()
+        with _TEXT_CACHE_LOCK:
+            _TEXT_CACHE[key] = content
+        return content
+    except NotFound:
+        logger.warning(f"File not found in GCS: {blob_path}")
+        return f"System: Error - File {filename} not found."
     except Exception as e:
         logger.error(f"GCS Internal Error: {e}")
-        return "System: Error loading profile."
\ No newline at end of file
+        return "System: Error loading profile."
+
+def invalidate_gcs_text(pid: str, filename: str = None):
+    """Drops cached text for one file, or for every file of a patient if filename is None."""
+    with _TEXT_CACHE_LOCK:
+        if filename is not None:
+            _TEXT_CACHE.pop((pid, filename), None)
+        else:
+            for key in [k for k in _TEXT_CACHE if k[0] == pid]:
+                _TEXT_CACHE.pop(key, None)
+
+def dumps_json(payload) -> str:
+    """orjson-encodes a payload as text; non-str dict keys are stringified like json.dumps."""
+    return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS).decode()
+
+async def send_ws_json(websocket, payload):
+    """Drop-in for websocket.send_json using orjson; still sends a text frame."""
+    await websocket.send_text(dumps_json(payload))